@@ -7,25 +7,35 @@ This script extracts temporal embeddings from audio files using:
 2. GPT-2 for extracting contextual embeddings from all 12 transformer layers
 
 The output includes:
-- CSV file with timestamps, words, and layer-wise embeddings
+- Parquet file with timestamps, words, and layer-wise embedding statistics
 - Heatmap visualization showing embedding evolution across layers and time
 """
 
 import argparse
+import json
 import os
+import socketserver
+import stat
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
+from queue import Empty, Queue
 from typing import List, Dict, Tuple, Optional
 import warnings
 
 import numpy as np
 import pandas as pd
 import torch
-import whisper
+import torch.nn.functional as F
+import torchaudio
 import librosa
-from transformers import GPT2Tokenizer, GPT2Model
-import matplotlib.pyplot as plt
-import seaborn as sns
+import soundfile as sf
+from faster_whisper import WhisperModel, BatchedInferencePipeline
+from transformers import BitsAndBytesConfig, GPT2TokenizerFast, GPT2Model
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
 from tqdm import tqdm
 
 # Suppress warnings for cleaner output
@@ -47,7 +57,12 @@ class AudioEmbeddingExtractor:
         self,
         whisper_model: str = "base",
         gpt2_model: str = "gpt2",
-        device: Optional[str] = None
+        device: Optional[str] = None,
+        backend: str = "faster_whisper",
+        compile_model: Optional[bool] = None,
+        quantize_gpt2: bool = False,
+        whisper_workers: int = 1,
+        reuse_kv_cache: bool = False
     ):
         """
         Initialize the extractor with specified models.
@@ -56,6 +71,15 @@ class AudioEmbeddingExtractor:
             whisper_model: Whisper model size ('tiny', 'base', 'small', 'medium', 'large')
             gpt2_model: GPT-2 model variant ('gpt2', 'gpt2-medium', 'gpt2-large', 'gpt2-xl')
             device: Device to use ('cuda', 'cpu', or None for auto-detect)
+            backend: Whisper implementation ('faster_whisper' for the CTranslate2
+                INT8 backend, 'openai' for the reference openai-whisper package)
+            compile_model: Compile GPT-2 with torch.compile (first call is
+                slower; default: only on CUDA)
+            quantize_gpt2: Load GPT-2 linear weights as INT8 via bitsandbytes (CUDA only)
+            whisper_workers: Number of threads that may transcribe concurrently
+                (faster-whisper only; openai-whisper calls are serialized)
+            reuse_kv_cache: Run GPT-2 incrementally over long texts, reusing
+                cached keys/values instead of recomputing window overlaps
         """
         # Determine device
         if device is None:
@@ -65,25 +89,101 @@ class AudioEmbeddingExtractor:
 
         print(f"Using device: {self.device}")
 
+        if backend not in ("faster_whisper", "openai"):
+            raise RuntimeError(f"Unknown Whisper backend: {backend}")
+        self.backend = backend
+
         # Load Whisper model for transcription
-        print(f"Loading Whisper model ({whisper_model})...")
+        print(f"Loading Whisper model ({whisper_model}, backend: {backend})...")
         try:
-            self.whisper_model = whisper.load_model(whisper_model, device=self.device)
+            if self.backend == "faster_whisper":
+                # INT8 weights via CTranslate2; activations stay fp16 on GPU
+                compute_type = "int8_float16" if self.device == "cuda" else "int8"
+                self.whisper_model = WhisperModel(
+                    whisper_model,
+                    device=self.device,
+                    compute_type=compute_type,
+                    num_workers=whisper_workers
+                )
+            else:
+                # openai-whisper is an optional backend, imported only when used
+                import whisper
+
+                self.whisper_model = whisper.load_model(whisper_model, device=self.device)
+                # Build the cached mel filter bank on the device up front. The
+                # cache is keyed by the audio tensor's torch.device ("cuda:0",
+                # not "cuda"), which matches the loaded model's device
+                whisper.audio.mel_filters(
+                    self.whisper_model.device, self.whisper_model.dims.n_mels
+                )
         except Exception as e:
             raise RuntimeError(f"Failed to load Whisper model: {e}")
 
         # Load GPT-2 model and tokenizer for embeddings
         print(f"Loading GPT-2 model ({gpt2_model})...")
         try:
-            self.tokenizer = GPT2Tokenizer.from_pretrained(gpt2_model)
-            self.gpt2_model = GPT2Model.from_pretrained(gpt2_model)
-            self.gpt2_model.to(self.device)
+            self.tokenizer = GPT2TokenizerFast.from_pretrained(gpt2_model)
+
+            if quantize_gpt2:
+                if self.device != "cuda":
+                    raise RuntimeError("INT8 GPT-2 quantization requires CUDA")
+                # Attention/MLP projections become INT8; LayerNorm and the
+                # token/position embeddings are not quantized and stay in bf16
+                self.gpt2_model = GPT2Model.from_pretrained(
+                    gpt2_model,
+                    quantization_config=BitsAndBytesConfig(load_in_8bit=True),
+                    torch_dtype=torch.bfloat16,
+                    device_map={"": self.device}
+                )
+            else:
+                self.gpt2_model = GPT2Model.from_pretrained(gpt2_model)
+                self.gpt2_model.to(self.device)
             self.gpt2_model.eval()  # Set to evaluation mode
+
+            # bf16 halves activation bandwidth and runs matmuls on tensor cores
+            self.use_bf16 = self.device == "cuda"
+            if self.use_bf16 and not quantize_gpt2:
+                self.gpt2_model = self.gpt2_model.to(dtype=torch.bfloat16)
+
+            # The KV-cache path feeds each call's cache into the next and
+            # changes the cache length every step, which CUDA-graph replay
+            # and static shapes cannot serve, so it runs the eager module
+            self._eager_gpt2 = self.gpt2_model
+
+            # Fuse LayerNorm/GELU/matmul kernels and capture CUDA graphs. On
+            # CPU there are no graphs to capture, and the compile cost and
+            # C++ toolchain it needs are not worth it for one-off runs
+            if compile_model is None:
+                compile_model = self.device == "cuda"
+            self.compiled = compile_model
+            if compile_model:
+                self.gpt2_model = torch.compile(
+                    self.gpt2_model,
+                    fullgraph=False,
+                    mode="reduce-overhead"
+                )
         except Exception as e:
             raise RuntimeError(f"Failed to load GPT-2 model: {e}")
 
+        # The models are shared between threads (see serve()). A WhisperModel
+        # can run concurrent transcriptions (up to whisper_workers), but the
+        # BatchedInferencePipeline around it keeps per-call state, so each
+        # thread wraps the shared model in its own pipeline. openai-whisper
+        # installs per-call hooks on the model, so those calls are
+        # serialized. GPT-2 forwards all run on one dedicated thread, since
+        # the CUDA graphs recorded by the compiled model are owned by the
+        # thread that recorded them
+        self._transcribe_lock = (
+            nullcontext() if self.backend == "faster_whisper" else threading.Lock()
+        )
+        self._thread_state = threading.local()
+        self._gpt2_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gpt2")
+
         # GPT-2 base has 12 layers (0-11)
         self.num_layers = self.gpt2_model.config.n_layer
+        self.hidden_size = self.gpt2_model.config.n_embd
+        self.max_positions = self.gpt2_model.config.n_positions
+        self.reuse_kv_cache = reuse_kv_cache
         print(f"GPT-2 model has {self.num_layers} layers")
 
     def load_audio(self, audio_path: str, sr: int = 16000) -> np.ndarray:
@@ -107,8 +207,25 @@ class AudioEmbeddingExtractor:
         print(f"\nLoading audio from: {audio_path}")
 
         try:
-            # Load audio and resample to target sample rate
-            audio, _ = librosa.load(audio_path, sr=sr, mono=True)
+            # Decode with libsndfile; fall back to librosa/audioread for
+            # containers libsndfile cannot read (e.g. M4A)
+            try:
+                audio, orig_sr = sf.read(audio_path, dtype='float32', always_2d=False)
+            except RuntimeError:
+                audio, orig_sr = librosa.load(audio_path, sr=sr, mono=True)
+
+            # Downmix to mono
+            if audio.ndim > 1:
+                audio = audio.mean(axis=1)
+
+            # Resample to target sample rate on the compute device
+            if orig_sr != sr:
+                audio = torchaudio.functional.resample(
+                    torch.from_numpy(audio).to(self.device),
+                    orig_sr,
+                    sr,
+                    resampling_method="sinc_interp_kaiser"
+                ).cpu().numpy()
 
             duration = len(audio) / sr
             print(f"Audio duration: {duration:.2f} seconds")
@@ -133,92 +250,469 @@ class AudioEmbeddingExtractor:
         print("\nTranscribing audio with Whisper...")
 
         try:
-            # Transcribe with word-level timestamps
-            result = self.whisper_model.transcribe(
-                audio,
-                word_timestamps=True,
-                verbose=False
-            )
+            with self._transcribe_lock:
+                if self.backend == "faster_whisper":
+                    result = self._transcribe_faster_whisper(audio)
+                else:
+                    result = self._transcribe_openai(audio)
 
-            # Extract word-level information
-            words_with_timestamps = []
-
-            for segment in result['segments']:
-                if 'words' in segment:
-                    for word_info in segment['words']:
-                        words_with_timestamps.append({
-                            'word': word_info['word'].strip(),
-                            'start': word_info['start'],
-                            'end': word_info['end']
-                        })
-
-            print(f"Transcription complete: {len(words_with_timestamps)} words detected")
+            print(f"Transcription complete: {len(result['words'])} words detected")
             print(f"Full text: {result['text']}")
 
-            return {
-                'text': result['text'],
-                'words': words_with_timestamps
-            }
+            return result
 
         except Exception as e:
             raise RuntimeError(f"Transcription failed: {e}")
 
-    def extract_gpt2_embeddings(self, text: str) -> Tuple[np.ndarray, List[str]]:
+    def _transcribe_faster_whisper(self, audio: np.ndarray) -> Dict:
+        """Transcribe with faster-whisper's batched, VAD-filtered pipeline."""
+        # The pipeline tracks the last speech timestamp of the call in flight
+        # on itself, so concurrent calls must not share one
+        pipeline = getattr(self._thread_state, 'pipeline', None)
+        if pipeline is None:
+            pipeline = BatchedInferencePipeline(self.whisper_model)
+            self._thread_state.pipeline = pipeline
+
+        # VAD skips silence; batching amortizes the decoder prefill
+        segments, _ = pipeline.transcribe(
+            audio,
+            word_timestamps=True,
+            batch_size=16,
+            vad_filter=True
+        )
+
+        # Segments are yielded lazily, so decoding happens while iterating
+        text_parts = []
+        words_with_timestamps = []
+
+        for segment in segments:
+            text_parts.append(segment.text)
+            for word_info in segment.words or []:
+                words_with_timestamps.append({
+                    'word': word_info.word.strip(),
+                    'start': word_info.start,
+                    'end': word_info.end
+                })
+
+        return {
+            'text': ''.join(text_parts),
+            'words': words_with_timestamps
+        }
+
+    def _transcribe_openai(self, audio: np.ndarray) -> Dict:
+        """Transcribe with the reference openai-whisper implementation."""
+        # Whisper computes the STFT and log-mel features on whatever device
+        # the audio tensor lives on, so hand it a device tensor rather than
+        # a numpy array to move feature extraction off the CPU
+        audio_tensor = torch.from_numpy(audio).to(self.device)
+
+        result = self.whisper_model.transcribe(
+            audio_tensor,
+            word_timestamps=True,
+            verbose=False
+        )
+
+        words_with_timestamps = []
+
+        for segment in result['segments']:
+            if 'words' in segment:
+                for word_info in segment['words']:
+                    words_with_timestamps.append({
+                        'word': word_info['word'].strip(),
+                        'start': word_info['start'],
+                        'end': word_info['end']
+                    })
+
+        return {
+            'text': result['text'],
+            'words': words_with_timestamps
+        }
+
+    def _window_input_ids(
+        self,
+        input_ids: torch.Tensor,
+        window_size: int,
+        overlap: int
+    ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
         """
-        Extract GPT-2 embeddings from all layers for the given text.
+        Split a (1, N) token sequence into overlapping fixed-size windows.
+
+        When GPT-2 is compiled, every window is padded to window_size and the
+        number of windows is rounded up to 1, 2, 4, 8 or a multiple of 8, so
+        the compiled model only ever sees a handful of input shapes. The
+        eager model takes any shape, so short inputs then run unpadded and
+        no filler windows are added.
 
         Args:
-            text: Input text to process
+            input_ids: Token ids of shape (1, num_tokens)
+            window_size: Number of tokens per window
+            overlap: Number of tokens shared by consecutive windows
 
         Returns:
-            Tuple of (embeddings array, token list)
-            - embeddings: shape (num_tokens, num_layers, hidden_size)
-            - tokens: list of token strings
+            Tuple of (windows, attention_mask, keep_index)
+            - windows: shape (num_windows, window_size)
+            - attention_mask: shape (num_windows, window_size), 0 on padding
+              that trails real tokens
+            - keep_index: indices into the flattened windows that, taken in
+              order, give exactly one hidden state per original token
         """
-        print("\nExtracting GPT-2 embeddings...")
+        num_tokens = input_ids.shape[1]
+
+        # Short inputs fit in a single unpadded window
+        if not self.compiled and num_tokens <= window_size:
+            keep_index = torch.arange(num_tokens, device=input_ids.device)
+            return input_ids, torch.ones_like(input_ids), keep_index
+
+        stride = window_size - overlap
+        half = overlap // 2
+        num_windows = max(1, -(-(num_tokens - window_size) // stride) + 1)
+
+        # Round the batch up to a few fixed sizes for the compiled model; the
+        # extra windows are pure filler and none of their positions are kept
+        if not self.compiled:
+            batch_size = num_windows
+        elif num_windows <= 8:
+            batch_size = 1 << (num_windows - 1).bit_length()
+        else:
+            batch_size = -(-num_windows // 8) * 8
+
+        # Pad so every window is full; padding only ever trails real tokens,
+        # so with causal attention it cannot change their hidden states
+        padded_len = (batch_size - 1) * stride + window_size
+        padded = F.pad(
+            input_ids,
+            (0, padded_len - num_tokens),
+            value=self.tokenizer.eos_token_id
+        )
+        windows = padded.unfold(1, window_size, stride).squeeze(0)
 
-        # Tokenize the text
-        inputs = self.tokenizer(text, return_tensors="pt")
-        input_ids = inputs['input_ids'].to(self.device)
+        # Absolute token position of every slot in every window
+        positions = (
+            torch.arange(batch_size, device=input_ids.device)[:, None] * stride
+            + torch.arange(window_size, device=input_ids.device)[None, :]
+        )
+        attention_mask = (positions < num_tokens).long()
+        # Filler windows are discarded; leave them unmasked so no attention
+        # row is masked out entirely
+        attention_mask[num_windows:] = 1
+
+        # Keep only the centre of each real window: drop the first half of
+        # the overlap (except in the first window) and everything past the
+        # next window's start (except in the last window)
+        keep = positions < num_tokens
+        keep[num_windows:] = False
+        keep[1:num_windows, :half] = False
+        keep[:num_windows - 1, stride + half:] = False
+        keep_index = keep.flatten().nonzero().squeeze(1)
+
+        return windows, attention_mask, keep_index
+
+    def _pinned_empty(self, shape: Tuple[int, ...], dtype: torch.dtype) -> torch.Tensor:
+        """Allocate a host tensor, page-locked when running on CUDA."""
+        return torch.empty(shape, dtype=dtype, pin_memory=self.device == "cuda")
+
+    def _to_host(self, tensor: torch.Tensor) -> torch.Tensor:
+        """
+        Start copying a device tensor into pinned host memory.
 
-        # Decode tokens for reference
-        tokens = [self.tokenizer.decode([token_id]) for token_id in input_ids[0]]
+        On CUDA the copy is asynchronous: synchronize the current stream
+        before reading the result.
+        """
+        host = self._pinned_empty(tuple(tensor.shape), tensor.dtype)
+        host.copy_(tensor, non_blocking=True)
+        return host
+
+    def _record_event(self) -> Optional[torch.cuda.Event]:
+        """Record an event on the current CUDA stream (None on CPU)."""
+        if self.device != "cuda":
+            return None
+        event = torch.cuda.Event()
+        event.record()
+        return event
+
+    def _write_staged_layer(
+        self,
+        embeddings: np.ndarray,
+        rows: slice,
+        layer_idx: int,
+        buffer: torch.Tensor,
+        copied: Optional[torch.cuda.Event]
+    ):
+        """Write one staged layer block into the embeddings array once its copy is done."""
+        if copied is not None:
+            copied.synchronize()
+        embeddings[rows, layer_idx, :] = buffer.numpy()
+        # Flush each block as it lands, so write-back is spread out instead
+        # of one burst of the whole array at the end
+        embeddings.flush()
+
+    def _forward_windows(self, input_ids: torch.Tensor, window_size: int, overlap: int):
+        """
+        Run GPT-2 over all overlapping windows as a single batch.
 
-        print(f"Processing {len(tokens)} tokens...")
+        Yields a single (hidden_states, keep_index, rows) block; see
+        _forward_with_kv_cache for the meaning of each item.
+        """
+        windows, attention_mask, keep_index = self._window_input_ids(
+            input_ids, window_size, overlap
+        )
+        print(f"  - Windows: {windows.shape[0]} x {windows.shape[1]} tokens")
 
-        # Extract embeddings from all layers
-        with torch.no_grad():
-            outputs = self.gpt2_model(
-                input_ids,
-                output_hidden_states=True  # Get all layer outputs
+        outputs = self.gpt2_model(
+            windows,
+            attention_mask=attention_mask,
+            output_hidden_states=True  # Get all layer outputs
+        )
+
+        # hidden_states holds (num_layers + 1) tensors, each of shape
+        # (num_windows, window_size, hidden_size). Hand over a list that is
+        # the only reference to them, so the caller can free layers early
+        hidden_states = list(outputs.hidden_states)
+        del outputs
+        yield hidden_states, keep_index, slice(0, input_ids.shape[1])
+
+    def _forward_with_kv_cache(self, input_ids: torch.Tensor, window_size: int, overlap: int):
+        """
+        Run GPT-2 incrementally, window_size - overlap new tokens per step.
+
+        Keys/values of earlier tokens are reused from the cache, so each step
+        only computes the new tokens. Once the context reaches GPT-2's
+        position limit, the cache is rebuilt from the last `overlap` tokens,
+        which are the only tokens ever recomputed.
+
+        Always runs the uncompiled model (see __init__).
+
+        Yields:
+            Tuples of (hidden_states, keep_index, rows)
+            - hidden_states: list of (num_layers + 1) tensors of shape
+              (1, n, hidden_size); entries may be cleared by the caller
+            - keep_index: indices of the positions to keep (None keeps all)
+            - rows: slice of the original tokens these positions correspond to
+        """
+        num_tokens = input_ids.shape[1]
+        step = window_size - overlap
+        past_key_values = None
+        past_len = 0
+        num_steps = 0
+
+        for start in range(0, num_tokens, step):
+            new_ids = input_ids[:, start:start + step]
+
+            # Context is full: restart it from the last `overlap` tokens
+            if past_len + new_ids.shape[1] > self.max_positions:
+                past_key_values = None
+                past_len = 0
+                if overlap > 0:
+                    seed = self._eager_gpt2(
+                        input_ids[:, start - overlap:start],
+                        use_cache=True
+                    )
+                    past_key_values = seed.past_key_values
+                    past_len = overlap
+
+            outputs = self._eager_gpt2(
+                new_ids,
+                past_key_values=past_key_values,
+                use_cache=True,
+                output_hidden_states=True
             )
+            past_key_values = outputs.past_key_values
+            hidden_states = list(outputs.hidden_states)
+            del outputs
+            past_len += new_ids.shape[1]
+            num_steps += 1
 
-            # hidden_states is a tuple of (num_layers + 1) tensors
-            # First element is embedding layer, rest are transformer layers
-            hidden_states = outputs.hidden_states
+            # Only the new positions are returned, so every one is kept
+            yield hidden_states, None, slice(start, start + new_ids.shape[1])
 
-            # Stack all transformer layer outputs
-            # Shape: (num_layers, batch_size, seq_len, hidden_size)
-            layer_embeddings = torch.stack(hidden_states[1:])  # Skip embedding layer
+        print(f"  - Incremental steps: {num_steps} x up to {step} tokens (KV cache)")
 
-            # Rearrange to (seq_len, num_layers, hidden_size)
-            layer_embeddings = layer_embeddings.squeeze(1).permute(1, 0, 2)
+    def extract_gpt2_embeddings(
+        self,
+        text: str,
+        window_size: int = 512,
+        overlap: int = 64,
+        embeddings_path: Optional[str] = None,
+        reuse_kv_cache: Optional[bool] = None
+    ) -> Tuple[Dict[str, np.ndarray], List[str], np.ndarray]:
+        """
+        Extract GPT-2 embedding statistics from all layers for the given text.
+
+        Long texts are split into overlapping windows that are run through
+        GPT-2 as a single batch, so attention cost grows with
+        num_tokens * window_size rather than num_tokens ** 2. With
+        reuse_kv_cache, the text is instead fed through GPT-2 in
+        window_size - overlap token steps that attend to cached keys/values
+        of earlier tokens (up to GPT-2's context limit), so overlapping
+        context is not recomputed.
+
+        The per-layer mean, std and L2 norm of every token are reduced on
+        the device, so only (num_tokens, num_layers) arrays are copied back.
+        The full hidden states leave the device only when embeddings_path
+        is given.
 
-            # Convert to numpy
-            embeddings = layer_embeddings.cpu().numpy()
+        Args:
+            text: Input text to process
+            window_size: Number of tokens per GPT-2 window
+            overlap: Number of context tokens shared by consecutive windows
+            embeddings_path: Optional .npy path; if given, the full float16
+                (num_tokens, num_layers, hidden_size) embeddings are streamed
+                into a memory-mapped file there, one layer at a time
+            reuse_kv_cache: Use the incremental KV-cache path
+                (default: the reuse_kv_cache given to __init__)
 
-        print(f"Extracted embeddings shape: {embeddings.shape}")
-        print(f"  - Tokens: {embeddings.shape[0]}")
-        print(f"  - Layers: {embeddings.shape[1]}")
-        print(f"  - Embedding dimension: {embeddings.shape[2]}")
+        Returns:
+            Tuple of (stats, token list, offsets)
+            - stats: dict with 'mean', 'std' and 'norm' float32 arrays,
+              each of shape (num_tokens, num_layers)
+            - tokens: list of token strings
+            - offsets: shape (num_tokens, 2), character span of each token in text
+        """
+        # Run on the GPT-2 thread, which owns the compiled model's CUDA graphs
+        return self._gpt2_executor.submit(
+            self._extract_gpt2_embeddings,
+            text,
+            window_size,
+            overlap,
+            embeddings_path,
+            reuse_kv_cache
+        ).result()
+
+    def _extract_gpt2_embeddings(
+        self,
+        text: str,
+        window_size: int = 512,
+        overlap: int = 64,
+        embeddings_path: Optional[str] = None,
+        reuse_kv_cache: Optional[bool] = None
+    ) -> Tuple[Dict[str, np.ndarray], List[str], np.ndarray]:
+        """Body of extract_gpt2_embeddings, run on the GPT-2 thread."""
+        print("\nExtracting GPT-2 embeddings...")
 
-        return embeddings, tokens
+        if reuse_kv_cache is None:
+            reuse_kv_cache = self.reuse_kv_cache
+
+        # Tokenize the text, keeping character offsets for word alignment
+        inputs = self.tokenizer(text, return_offsets_mapping=True, return_tensors="pt")
+        input_ids = inputs['input_ids']
+        if self.device == "cuda":
+            # Pinned memory lets the copy run asynchronously, without a
+            # staging bounce buffer
+            input_ids = input_ids.pin_memory()
+        input_ids = input_ids.to(self.device, non_blocking=True)
+        offsets = inputs['offset_mapping'][0].numpy()
+
+        # Token strings for reference, sliced from the text by offset
+        # instead of decoding each token id separately
+        tokens = [text[start:end] for start, end in offsets.tolist()]
+
+        num_tokens = len(tokens)
+        hidden_size = self.hidden_size
+        print(f"Processing {num_tokens} tokens...")
+
+        # Per-layer statistics, reduced on the device
+        # Shape: (seq_len, num_layers)
+        means = torch.empty(num_tokens, self.num_layers, device=self.device)
+        stds = torch.empty_like(means)
+        norms = torch.empty_like(means)
+
+        # Full embeddings only when asked for, stored as float16 to halve
+        # host memory and write bandwidth
+        embeddings = None
+        if embeddings_path is not None:
+            embeddings = np.lib.format.open_memmap(
+                embeddings_path,
+                mode='w+',
+                dtype=np.float16,
+                shape=(num_tokens, self.num_layers, hidden_size)
+            )
+
+        # Double-buffered pinned staging for the full embeddings: while
+        # one layer block is copied off the device, the previous one is
+        # written to disk
+        staging = []
+        if embeddings is not None:
+            block_rows = min(num_tokens, window_size - overlap) if reuse_kv_cache else num_tokens
+            staging = [
+                self._pinned_empty((block_rows, hidden_size), torch.float16)
+                for _ in range(2)
+            ]
+        pending = None
+        num_staged = 0
+
+        if reuse_kv_cache:
+            blocks = self._forward_with_kv_cache(input_ids, window_size, overlap)
+        else:
+            blocks = self._forward_windows(input_ids, window_size, overlap)
+
+        # Extract embeddings from all layers
+        with torch.inference_mode(), torch.autocast(
+            self.device, dtype=torch.bfloat16, enabled=self.use_bf16
+        ):
+            for hidden_states, keep_index, rows in blocks:
+                # First element of hidden_states is the embedding layer, rest
+                # are transformer layers. Stitch the kept positions back into
+                # one sequence one layer at a time, so no stacked copy of
+                # every layer is built, and drop each layer as soon as its
+                # work is queued. With the eager model (CPU, --no-compile or
+                # the KV-cache path) that lets the allocator reuse its memory
+                # for the next layer's temporaries; outputs of the compiled
+                # model live in the CUDA-graph pool, which eager temporaries
+                # cannot allocate from, so there it only drops the reference
+                hidden_states[0] = None  # Skip embedding layer
+                for layer_idx in range(self.num_layers):
+                    h = hidden_states[layer_idx + 1]
+                    hidden_states[layer_idx + 1] = None
+
+                    layer = h.reshape(-1, hidden_size)
+                    if keep_index is not None:
+                        layer = layer.index_select(0, keep_index)
+                    layer = layer.float()
+
+                    means[rows, layer_idx] = layer.mean(dim=-1)
+                    stds[rows, layer_idx] = layer.std(dim=-1, unbiased=False)
+                    norms[rows, layer_idx] = layer.norm(dim=-1)
+
+                    if embeddings is not None:
+                        buffer = staging[num_staged % 2][:layer.shape[0]]
+                        buffer.copy_(layer.to(torch.float16), non_blocking=True)
+                        copied = self._record_event()
+                        num_staged += 1
+
+                        if pending is not None:
+                            self._write_staged_layer(embeddings, *pending)
+                        pending = (rows, layer_idx, buffer, copied)
+
+                    del h, layer
+
+            if pending is not None:
+                self._write_staged_layer(embeddings, *pending)
+
+            # Issue all statistic copies before a single synchronization
+            host_stats = {
+                'mean': self._to_host(means),
+                'std': self._to_host(stds),
+                'norm': self._to_host(norms)
+            }
+            if self.device == "cuda":
+                torch.cuda.current_stream().synchronize()
+            stats = {name: values.numpy() for name, values in host_stats.items()}
+
+        print(f"Extracted statistics for {num_tokens} tokens x {self.num_layers} layers")
+        print(f"  - Embedding dimension: {hidden_size}")
+
+        if embeddings is not None:
+            embeddings.flush()
+            print(f"Saved full embeddings to: {embeddings_path}")
+
+        return stats, tokens, offsets
 
     def align_embeddings_to_words(
         self,
         words_with_timestamps: List[Dict],
         tokens: List[str],
-        embeddings: np.ndarray
+        stats: Dict[str, np.ndarray],
+        offsets: np.ndarray
     ) -> pd.DataFrame:
         """
         Align GPT-2 token embeddings to word-level timestamps from Whisper.
@@ -226,121 +720,99 @@ class AudioEmbeddingExtractor:
         This is a simplified alignment that maps words to their corresponding tokens.
         For more sophisticated alignment, consider using forced alignment tools.
 
+        The tokens must come from the space-joined words (see
+        process_audio_file), so that each token's character offset falls
+        inside the span of the word it belongs to.
+
         Args:
             words_with_timestamps: List of words with timing information
             tokens: List of GPT-2 tokens
-            embeddings: Token embeddings array
+            stats: Per-token layer statistics from extract_gpt2_embeddings
+            offsets: Character span of each token, as returned by
+                extract_gpt2_embeddings
 
         Returns:
             DataFrame with columns: timestamp, word, layer_0, layer_1, ..., layer_N
         """
         print("\nAligning embeddings to word timestamps...")
 
-        # Create a simple word-to-token mapping
-        # This is approximate and could be improved with more sophisticated alignment
-        words = [w['word'] for w in words_with_timestamps]
-        full_text = ' '.join(words)
-
-        # Re-tokenize to get alignment
-        token_positions = []
-        current_pos = 0
-
-        for i, word_info in enumerate(words_with_timestamps):
-            word = word_info['word']
-            # Find which tokens correspond to this word
-            word_tokens = self.tokenizer.encode(word, add_special_tokens=False)
-
-            # Simple mapping: assign the timestamp to all tokens of this word
-            for _ in word_tokens:
-                if current_pos < len(tokens):
-                    token_positions.append({
-                        'word': word,
-                        'start': word_info['start'],
-                        'end': word_info['end'],
-                        'token_idx': current_pos
-                    })
-                    current_pos += 1
-
-        # Build DataFrame with embeddings
-        rows = []
-
-        for pos in token_positions:
-            row = {
-                'timestamp': pos['start'],
-                'word': pos['word'],
-                'token': tokens[pos['token_idx']].replace('\n', '\\n')
-            }
-
-            # Add embeddings from each layer
-            token_idx = pos['token_idx']
-            for layer_idx in range(embeddings.shape[1]):
-                # Store the full embedding vector as a string representation
-                # or key statistics (mean, std) for CSV compatibility
-                layer_emb = embeddings[token_idx, layer_idx, :]
-
-                # Option 1: Store statistics (more CSV-friendly)
-                row[f'layer_{layer_idx}_mean'] = np.mean(layer_emb)
-                row[f'layer_{layer_idx}_std'] = np.std(layer_emb)
-                row[f'layer_{layer_idx}_norm'] = np.linalg.norm(layer_emb)
-
-                # Option 2: Store full vector (can be very wide)
-                # Uncomment if you need full vectors in CSV
-                # for dim_idx, val in enumerate(layer_emb):
-                #     row[f'layer_{layer_idx}_dim_{dim_idx}'] = val
-
-            rows.append(row)
+        # Per-word arrays; character span of each word in ' '.join(words)
+        words = np.array([w['word'] for w in words_with_timestamps], dtype=object)
+        word_starts = np.array([w['start'] for w in words_with_timestamps], dtype=np.float64)
+        word_lengths = np.array([len(word) for word in words], dtype=np.int64)
+        word_char_starts = np.concatenate(([0], np.cumsum(word_lengths + 1)[:-1]))
+        word_char_ends = word_char_starts + word_lengths
+
+        # A token belongs to the first word that ends after the token starts
+        token_word_ids = np.searchsorted(word_char_ends, offsets[:, 0], side='right')
+        token_word_ids = np.minimum(token_word_ids, len(words) - 1)
+
+        num_layers = stats['mean'].shape[1]
+
+        # One row per token: gather word-level fields by word id
+        data = {
+            'timestamp': word_starts[token_word_ids],
+            'word': words[token_word_ids],
+            'token': np.array([token.replace('\n', '\\n') for token in tokens], dtype=object)
+        }
+
+        # Store key statistics rather than full vectors to keep the table narrow;
+        # full vectors can be saved to the _full.npy output instead.
+        # Columns are grouped per layer: layer_0_mean, layer_0_std, layer_0_norm, ...
+        for layer_idx in range(num_layers):
+            for stat in ('mean', 'std', 'norm'):
+                data[f'layer_{layer_idx}_{stat}'] = stats[stat][:, layer_idx]
 
-        df = pd.DataFrame(rows)
+        # Columns are already typed arrays, so pandas skips per-cell type inference
+        df = pd.DataFrame(data, copy=False)
         print(f"Created DataFrame with {len(df)} rows and {len(df.columns)} columns")
 
-        return df, embeddings, tokens
+        return df
 
     def save_embeddings(
         self,
         df: pd.DataFrame,
-        output_path: str,
-        embeddings: Optional[np.ndarray] = None
+        output_path: str
     ):
         """
-        Save embeddings to CSV file.
+        Save embeddings to a zstd-compressed Parquet file.
+
+        Full embeddings are not handled here; extract_gpt2_embeddings
+        streams them to disk while GPT-2 runs.
 
         Args:
             df: DataFrame containing aligned embeddings
-            output_path: Path to save the CSV file
-            embeddings: Optional full embeddings array to save separately
+            output_path: Path to save the Parquet file
         """
         print(f"\nSaving embeddings to: {output_path}")
 
-        # Save CSV with statistics
-        df.to_csv(output_path, index=False)
-        print(f"Saved CSV with shape: {df.shape}")
-
-        # Optionally save full embeddings as numpy array
-        if embeddings is not None:
-            npy_path = output_path.replace('.csv', '_full.npy')
-            np.save(npy_path, embeddings)
-            print(f"Saved full embeddings to: {npy_path}")
+        # Save statistics as columnar binary; float32 is ample for mean/std/norm
+        float_cols = df.select_dtypes('float64').columns
+        df = df.astype({col: 'float32' for col in float_cols if col.startswith('layer_')})
+        df.to_parquet(output_path, engine='pyarrow', compression='zstd', index=False)
+        print(f"Saved Parquet with shape: {df.shape}")
 
     def visualize_embeddings(
         self,
         df: pd.DataFrame,
-        embeddings: np.ndarray,
         output_path: str,
-        metric: str = 'norm'
+        metric: str = 'norm',
+        max_points: int = 2000
     ):
         """
         Create a heatmap visualization of embeddings across layers and time.
 
         Args:
             df: DataFrame with embedding statistics
-            embeddings: Full embeddings array
             output_path: Path to save the visualization
             metric: Which metric to visualize ('mean', 'std', 'norm')
+            max_points: Longer transcripts are averaged over blocks of
+                consecutive tokens down to at most this many time points
         """
         print(f"\nGenerating visualization...")
 
         # Extract the metric for each layer
-        num_layers = embeddings.shape[1]
+        num_layers = self.num_layers
         layer_cols = [f'layer_{i}_{metric}' for i in range(num_layers)]
 
         if not all(col in df.columns for col in layer_cols):
@@ -349,19 +821,34 @@ class AudioEmbeddingExtractor:
 
         # Create heatmap data
         heatmap_data = df[layer_cols].values.T  # Transpose: layers x time
+        time_points = df['timestamp'].values
 
-        # Create figure
-        fig, axes = plt.subplots(2, 1, figsize=(16, 10))
-
-        # Heatmap
+        # Average blocks of consecutive tokens for long transcripts; more
+        # columns than this cannot be resolved in the figure anyway
+        num_points = heatmap_data.shape[1]
+        if num_points > max_points:
+            stride = -(-num_points // max_points)
+            usable = stride * (num_points // stride)
+            heatmap_data = heatmap_data[:, :usable].reshape(num_layers, -1, stride).mean(axis=-1)
+            time_points = time_points[:usable:stride]
+            print(f"Downsampled {num_points} tokens to {heatmap_data.shape[1]} time points")
+
+        # Create figure (via Figure rather than pyplot, whose global state
+        # is not thread-safe, so plots can be rendered from worker threads)
+        fig = Figure(figsize=(16, 10))
+        axes = fig.subplots(2, 1)
+
+        # Heatmap, drawn as a single raster image rather than one patch per cell
         ax1 = axes[0]
-        sns.heatmap(
+        im = ax1.imshow(
             heatmap_data,
+            aspect='auto',
             cmap='viridis',
-            cbar_kws={'label': f'Embedding {metric.capitalize()}'},
-            ax=ax1,
-            xticklabels=False
+            interpolation='nearest'
         )
+        fig.colorbar(im, ax=ax1, label=f'Embedding {metric.capitalize()}')
+        ax1.set_xticks([])
+        ax1.set_yticks(range(num_layers))
         ax1.set_ylabel('Layer', fontsize=12)
         ax1.set_title(
             f'GPT-2 Embedding Evolution Across Layers and Time\n'
@@ -370,18 +857,23 @@ class AudioEmbeddingExtractor:
             fontweight='bold'
         )
 
-        # Time series for each layer
+        # Time series for each layer, batched into one LineCollection
+        # and coloured by layer index
         ax2 = axes[1]
-        time_points = df['timestamp'].values
 
-        for layer_idx in range(num_layers):
-            values = df[f'layer_{layer_idx}_{metric}'].values
-            ax2.plot(time_points, values, alpha=0.6, label=f'Layer {layer_idx}')
+        segments = np.stack([
+            np.column_stack([time_points, heatmap_data[layer_idx]])
+            for layer_idx in range(num_layers)
+        ])
+        lines = LineCollection(segments, cmap='viridis', alpha=0.6)
+        lines.set_array(np.arange(num_layers))
+        ax2.add_collection(lines)
+        ax2.autoscale_view()
+        fig.colorbar(lines, ax=ax2, label='Layer')
 
         ax2.set_xlabel('Time (seconds)', fontsize=12)
         ax2.set_ylabel(f'Embedding {metric.capitalize()}', fontsize=12)
         ax2.set_title('Temporal Evolution by Layer', fontsize=12, fontweight='bold')
-        ax2.legend(bbox_to_anchor=(1.05, 1), loc='upper left', fontsize=8)
         ax2.grid(True, alpha=0.3)
 
         # Add word annotations if not too many
@@ -396,15 +888,15 @@ class AudioEmbeddingExtractor:
                     linewidth=0.5
                 )
 
-        plt.tight_layout()
-        plt.savefig(output_path, dpi=300, bbox_inches='tight')
+        fig.tight_layout()
+        fig.savefig(output_path, dpi=150, bbox_inches='tight')
         print(f"Saved visualization to: {output_path}")
-        plt.close()
 
     def process_audio_file(
         self,
         audio_path: str,
-        output_dir: Optional[str] = None
+        output_dir: Optional[str] = None,
+        save_full_embeddings: bool = False
     ) -> Tuple[pd.DataFrame, str, str]:
         """
         Complete pipeline: process audio file and generate outputs.
@@ -412,10 +904,277 @@ class AudioEmbeddingExtractor:
         Args:
             audio_path: Path to input audio file
             output_dir: Directory for outputs (default: ../data/embeddings/)
+            save_full_embeddings: Also write the full hidden states to
+                <name>_embeddings_full.npy
+
+        Returns:
+            Tuple of (DataFrame, parquet_path, plot_path)
+        """
+        parquet_path, npy_path, plot_path = self._output_paths(audio_path, output_dir)
+
+        # Step 1: Load audio
+        audio = self.load_audio(audio_path)
+
+        # Steps 2-4: Transcribe, extract and align embeddings
+        df = self._embed_audio(audio, str(npy_path) if save_full_embeddings else None)
+
+        # Steps 5-6: Save embeddings and create visualization
+        self._write_outputs(df, str(parquet_path), str(plot_path))
+
+        print("\n" + "="*60)
+        print("PROCESSING COMPLETE!")
+        print("="*60)
+        print(f"Parquet output: {parquet_path}")
+        print(f"Visualization: {plot_path}")
+        print("="*60)
+
+        return df, str(parquet_path), str(plot_path)
+
+    def process_audio_files(
+        self,
+        audio_paths: List[str],
+        output_dir: Optional[str] = None,
+        save_full_embeddings: bool = False,
+        num_workers: Optional[int] = None
+    ) -> List[Tuple[pd.DataFrame, str, str]]:
+        """
+        Process several audio files as a pipeline.
+
+        Loader threads decode audio into a bounded queue, the calling thread
+        runs Whisper and GPT-2 on one file at a time, and writer threads save
+        the Parquet files and plots, so I/O and plotting overlap with the
+        model work instead of running between files.
+
+        Files that fail are reported and skipped.
+
+        Args:
+            audio_paths: Paths to input audio files
+            output_dir: Directory for outputs (default: ../data/embeddings/)
+            save_full_embeddings: Also write the full hidden states to
+                <name>_embeddings_full.npy
+            num_workers: Threads for loading and for writing
+                (default: CPU count, at most 4)
 
         Returns:
-            Tuple of (DataFrame, csv_path, plot_path)
+            List of (DataFrame, parquet_path, plot_path), in input order,
+            for the files that were processed successfully
         """
+        if num_workers is None:
+            num_workers = min(4, os.cpu_count() or 1)
+
+        # Files with the same stem would overwrite each other's outputs
+        output_paths = [self._output_paths(path, output_dir) for path in audio_paths]
+        claimed = {}
+        clashes = []
+        for audio_path, (parquet_path, _, _) in zip(audio_paths, output_paths):
+            if parquet_path in claimed:
+                clashes.append(f"{claimed[parquet_path]} and {audio_path}")
+            else:
+                claimed[parquet_path] = audio_path
+        if clashes:
+            raise RuntimeError(
+                "Input files would write the same outputs: " + "; ".join(clashes)
+            )
+
+        # Bounded so decoded audio cannot pile up ahead of the models
+        audio_queue = Queue(maxsize=4)
+
+        def load(index):
+            try:
+                audio_queue.put((index, self.load_audio(audio_paths[index]), None))
+            except Exception as e:
+                audio_queue.put((index, None, e))
+
+        # Keyed by input index, so results come back in input order
+        pending_writes = {}
+
+        loaders = ThreadPoolExecutor(max_workers=num_workers)
+        writers = ThreadPoolExecutor(max_workers=num_workers)
+        loads = [loaders.submit(load, index) for index in range(len(audio_paths))]
+        finished = False
+        try:
+            # This thread is the single consumer that runs the models
+            for _ in tqdm(range(len(audio_paths)), desc="Files", unit="file"):
+                index, audio, error = audio_queue.get()
+                audio_path = audio_paths[index]
+                if error is None:
+                    try:
+                        parquet_path, npy_path, plot_path = output_paths[index]
+                        df = self._embed_audio(
+                            audio, str(npy_path) if save_full_embeddings else None
+                        )
+                        future = writers.submit(
+                            self._write_outputs, df, str(parquet_path), str(plot_path)
+                        )
+                        pending_writes[index] = (
+                            future, (df, str(parquet_path), str(plot_path))
+                        )
+                    except Exception as e:
+                        error = e
+                    del audio
+
+                if error is not None:
+                    print(f"\nError processing {audio_path}: {error}", file=sys.stderr)
+            finished = True
+        finally:
+            # On an early exit (e.g. Ctrl+C), drop loads that have not
+            # started and drain the queue so running loaders blocked on a
+            # full queue can return instead of hanging the shutdown
+            loaders.shutdown(wait=False, cancel_futures=True)
+            while not all(load_future.done() for load_future in loads):
+                try:
+                    audio_queue.get(timeout=0.1)
+                except Empty:
+                    pass
+            loaders.shutdown()
+            writers.shutdown(cancel_futures=not finished)
+
+        results = []
+        for index, audio_path in enumerate(audio_paths):
+            if index not in pending_writes:
+                continue
+            future, result = pending_writes[index]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"\nError saving outputs for {audio_path}: {e}", file=sys.stderr)
+                continue
+            results.append(result)
+
+        print("\n" + "="*60)
+        print(f"PROCESSED {len(results)}/{len(audio_paths)} FILES")
+        print("="*60)
+
+        return results
+
+    def serve(
+        self,
+        socket_path: str,
+        num_workers: int = 2,
+        output_dir: Optional[str] = None,
+        save_full_embeddings: bool = False
+    ):
+        """
+        Serve extraction requests over a Unix socket, reusing the loaded models.
+
+        Each connection sends newline-delimited JSON requests such as
+        {"audio_path": "input.wav"}, optionally with "output_dir" and
+        "save_full" overriding the server defaults, and receives one JSON
+        line per request: {"ok": true, "parquet_path": ..., "plot_path": ...,
+        "num_tokens": ...} or {"ok": false, "error": ...}.
+
+        Requests are queued for num_workers threads that run
+        process_audio_file against this single extractor. GPT-2 forwards
+        from all workers are handed to the extractor's single GPT-2 thread.
+        A request whose output files are already being written by another
+        request is rejected. Blocks until interrupted.
+
+        Args:
+            socket_path: Filesystem path of the Unix socket to listen on
+            num_workers: Number of worker threads processing requests
+            output_dir: Default directory for outputs (default: ../data/embeddings/)
+            save_full_embeddings: Default for writing <name>_embeddings_full.npy
+        """
+        jobs = Queue()
+
+        # Output files of the requests being processed; a request whose
+        # outputs are already being written by another one is rejected
+        in_flight = set()
+        in_flight_lock = threading.Lock()
+
+        def worker():
+            while True:
+                job = jobs.get()
+                if job is None:
+                    return
+
+                request, reply = job
+                claimed = None
+                try:
+                    request_dir = request.get('output_dir', output_dir)
+                    parquet_path, _, _ = self._output_paths(
+                        request['audio_path'], request_dir
+                    )
+                    with in_flight_lock:
+                        if parquet_path.resolve() in in_flight:
+                            raise RuntimeError(
+                                f"Outputs {parquet_path} are being written by another request"
+                            )
+                        claimed = parquet_path.resolve()
+                        in_flight.add(claimed)
+
+                    df, parquet_path, plot_path = self.process_audio_file(
+                        request['audio_path'],
+                        output_dir=request_dir,
+                        save_full_embeddings=request.get('save_full', save_full_embeddings)
+                    )
+                    reply.put({
+                        'ok': True,
+                        'parquet_path': parquet_path,
+                        'plot_path': plot_path,
+                        'num_tokens': len(df)
+                    })
+                except Exception as e:
+                    reply.put({'ok': False, 'error': str(e)})
+                finally:
+                    if claimed is not None:
+                        with in_flight_lock:
+                            in_flight.discard(claimed)
+
+        class RequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+
+                    try:
+                        request = json.loads(line)
+                        if not (
+                            isinstance(request, dict)
+                            and isinstance(request.get('audio_path'), str)
+                        ):
+                            raise ValueError("expected an object with a string 'audio_path'")
+                    except ValueError as e:
+                        response = {'ok': False, 'error': f"Invalid request: {e}"}
+                    else:
+                        reply = Queue(maxsize=1)
+                        jobs.put((request, reply))
+                        response = reply.get()
+
+                    self.wfile.write((json.dumps(response) + '\n').encode())
+
+        # Remove a stale socket left behind by a previous run, but never
+        # another kind of file that happens to sit at that path
+        if os.path.lexists(socket_path):
+            if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+                raise RuntimeError(f"{socket_path} exists and is not a socket")
+            os.unlink(socket_path)
+
+        workers = [
+            threading.Thread(target=worker, name=f"extractor-worker-{i}", daemon=True)
+            for i in range(num_workers)
+        ]
+        for thread in workers:
+            thread.start()
+
+        server = socketserver.ThreadingUnixStreamServer(socket_path, RequestHandler)
+        server.daemon_threads = True
+        print(f"\nServing on {socket_path} with {num_workers} workers (Ctrl+C to stop)")
+
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            os.unlink(socket_path)
+            for _ in workers:
+                jobs.put(None)
+
+    def _output_paths(
+        self,
+        audio_path: str,
+        output_dir: Optional[str] = None
+    ) -> Tuple[Path, Path, Path]:
+        """Create the output directory and return (parquet, npy, plot) paths."""
         # Set up output directory
         if output_dir is None:
             output_dir = Path(__file__).parent.parent / "data" / "embeddings"
@@ -425,39 +1184,44 @@ class AudioEmbeddingExtractor:
 
         # Generate output filenames
         audio_name = Path(audio_path).stem
-        csv_path = output_dir / f"{audio_name}_embeddings.csv"
+        parquet_path = output_dir / f"{audio_name}_embeddings.parquet"
+        npy_path = output_dir / f"{audio_name}_embeddings_full.npy"
         plot_path = output_dir / f"{audio_name}_visualization.png"
 
-        # Step 1: Load audio
-        audio = self.load_audio(audio_path)
+        return parquet_path, npy_path, plot_path
 
+    def _embed_audio(
+        self,
+        audio: np.ndarray,
+        embeddings_path: Optional[str] = None
+    ) -> pd.DataFrame:
+        """Model stage: transcribe, extract GPT-2 statistics and align them."""
         # Step 2: Transcribe with timestamps
         transcription = self.transcribe_with_timestamps(audio)
 
-        # Step 3: Extract GPT-2 embeddings
-        embeddings, tokens = self.extract_gpt2_embeddings(transcription['text'])
+        # Step 3: Extract GPT-2 embedding statistics
+        # Embed the space-joined words so token offsets line up with words
+        text = ' '.join(w['word'] for w in transcription['words'])
+        stats, tokens, offsets = self.extract_gpt2_embeddings(
+            text,
+            embeddings_path=embeddings_path
+        )
 
         # Step 4: Align embeddings to words
-        df, embeddings, tokens = self.align_embeddings_to_words(
+        return self.align_embeddings_to_words(
             transcription['words'],
             tokens,
-            embeddings
+            stats,
+            offsets
         )
 
+    def _write_outputs(self, df: pd.DataFrame, parquet_path: str, plot_path: str):
+        """Output stage: save the statistics table and the visualization."""
         # Step 5: Save embeddings
-        self.save_embeddings(df, str(csv_path), embeddings)
+        self.save_embeddings(df, parquet_path)
 
         # Step 6: Create visualization
-        self.visualize_embeddings(df, embeddings, str(plot_path))
-
-        print("\n" + "="*60)
-        print("PROCESSING COMPLETE!")
-        print("="*60)
-        print(f"CSV output: {csv_path}")
-        print(f"Visualization: {plot_path}")
-        print("="*60)
-
-        return df, str(csv_path), str(plot_path)
+        self.visualize_embeddings(df, plot_path)
 
 
 def main():
@@ -470,6 +1234,13 @@ Examples:
   # Basic usage
   python extract_embeddings.py input.wav
 
+  # Process several files as one pipelined batch
+  python extract_embeddings.py data/test_samples/*.wav
+
+  # Keep the models loaded and serve requests on a Unix socket
+  python extract_embeddings.py --serve /tmp/sonotheia.sock --workers 3
+  echo '{"audio_path": "input.wav"}' | socat - UNIX-CONNECT:/tmp/sonotheia.sock
+
   # Specify output directory
   python extract_embeddings.py input.mp3 --output-dir ./my_embeddings/
 
@@ -478,13 +1249,44 @@ Examples:
 
   # Force CPU usage
   python extract_embeddings.py input.wav --device cpu
+
+  # Use the reference openai-whisper implementation
+  python extract_embeddings.py input.wav --whisper-backend openai
+
+  # Skip torch.compile (faster start-up for a single short file)
+  python extract_embeddings.py input.wav --no-compile
+
+  # Also save the full (tokens, layers, hidden) embeddings
+  python extract_embeddings.py input.wav --save-full
+
+  # Reuse GPT-2 keys/values instead of recomputing window overlaps
+  python extract_embeddings.py long_talk.wav --kv-cache
+
+  # Load GPT-2 with INT8 weights (CUDA + bitsandbytes required)
+  python extract_embeddings.py input.wav --gpt2-model gpt2-xl --int8-gpt2
         """
     )
 
     parser.add_argument(
-        'audio_file',
+        'audio_files',
         type=str,
-        help='Path to the audio file to process'
+        nargs='*',
+        help='Path(s) to the audio file(s) to process'
+    )
+
+    parser.add_argument(
+        '--serve',
+        type=str,
+        default=None,
+        metavar='SOCKET_PATH',
+        help='Keep the models loaded and serve JSON requests on this Unix socket'
+    )
+
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=2,
+        help='Worker threads sharing the loaded models in --serve mode (default: 2)'
     )
 
     parser.add_argument(
@@ -494,6 +1296,12 @@ Examples:
         help='Directory for output files (default: ../data/embeddings/)'
     )
 
+    parser.add_argument(
+        '--save-full',
+        action='store_true',
+        help='Also save full embedding vectors to <name>_embeddings_full.npy'
+    )
+
     parser.add_argument(
         '--whisper-model',
         type=str,
@@ -518,21 +1326,77 @@ Examples:
         help='Device to use for computation (default: auto-detect)'
     )
 
+    parser.add_argument(
+        '--whisper-backend',
+        type=str,
+        default='faster_whisper',
+        choices=['faster_whisper', 'openai'],
+        help='Whisper implementation: faster_whisper (CTranslate2 INT8) '
+             'or openai (default: faster_whisper)'
+    )
+
+    parser.add_argument(
+        '--no-compile',
+        action='store_true',
+        help='Disable torch.compile for the GPT-2 model (only used on CUDA)'
+    )
+
+    parser.add_argument(
+        '--kv-cache',
+        action='store_true',
+        help='Run GPT-2 incrementally with a key/value cache instead of '
+             'batched overlapping windows'
+    )
+
+    parser.add_argument(
+        '--int8-gpt2',
+        action='store_true',
+        help='Load GPT-2 weights as INT8 via bitsandbytes (CUDA only)'
+    )
+
     args = parser.parse_args()
 
+    if not args.audio_files and args.serve is None:
+        parser.error("at least one audio file is required unless --serve is given")
+
     try:
         # Initialize extractor
         extractor = AudioEmbeddingExtractor(
             whisper_model=args.whisper_model,
             gpt2_model=args.gpt2_model,
-            device=args.device
+            device=args.device,
+            backend=args.whisper_backend,
+            compile_model=False if args.no_compile else None,
+            quantize_gpt2=args.int8_gpt2,
+            whisper_workers=args.workers if args.serve else 1,
+            reuse_kv_cache=args.kv_cache
         )
 
-        # Process audio file
-        extractor.process_audio_file(
-            audio_path=args.audio_file,
-            output_dir=args.output_dir
-        )
+        # Long-lived server mode
+        if args.serve is not None:
+            extractor.serve(
+                socket_path=args.serve,
+                num_workers=args.workers,
+                output_dir=args.output_dir,
+                save_full_embeddings=args.save_full
+            )
+            return 0
+
+        # Process a single audio file directly, several as a pipeline
+        if len(args.audio_files) == 1:
+            extractor.process_audio_file(
+                audio_path=args.audio_files[0],
+                output_dir=args.output_dir,
+                save_full_embeddings=args.save_full
+            )
+        else:
+            results = extractor.process_audio_files(
+                audio_paths=args.audio_files,
+                output_dir=args.output_dir,
+                save_full_embeddings=args.save_full
+            )
+            if len(results) < len(args.audio_files):
+                return 1
 
         return 0
 